@@ -0,0 +1,53 @@
+import pandas as pd
+
+LOW_CONFIDENCE_THRESHOLD = 0.75
+PERIOD_FREQUENCIES = {'monthly': 'MS', 'weekly': 'W'}
+
+def build_period_rollups(df_cat):
+    if 'transaction_date' not in df_cat.columns:
+        return None
+    dated = df_cat.loc[df_cat['transaction_date'].notna(), ['transaction_date', 'category', 'amount']]
+    if dated.empty:
+        return None
+    indexed = dated.set_index('transaction_date')
+    rollups = {}
+    for period, freq in PERIOD_FREQUENCIES.items():
+        rollups[period] = (indexed.groupby([pd.Grouper(freq=freq), 'category'])['amount']
+                           .agg(amount='sum', count='size')
+                           .reset_index()
+                           .rename(columns={'transaction_date': 'period'}))
+    return rollups
+
+def period_expense_table(rollups, period='monthly'):
+    rollup = rollups[period]
+    table = rollup.pivot(index='period', columns='category', values='amount')
+    all_periods = pd.date_range(table.index.min(), table.index.max(), freq=PERIOD_FREQUENCIES[period])
+    table = table.reindex(all_periods).fillna(0.0)
+    return table.drop(columns=['Income'], errors='ignore')
+
+def summarize_transactions(df_cat, top_n=10):
+    if 'is_duplicate' in df_cat.columns:
+        df_cat = df_cat[~df_cat['is_duplicate']]
+    grouped = df_cat.groupby('category')['amount'].agg(['sum', 'size'])
+    category_spending = grouped['sum'].sort_values(ascending=False)
+    category_counts = grouped['size'].sort_values(ascending=False)
+    total_amount = float(category_spending.sum())
+    total_income = float(category_spending.get('Income', 0.0))
+    total_expenses = total_amount - total_income
+    expense_rows = df_cat[df_cat['category'] != 'Income']
+    confidence = df_cat['confidence']
+    return {
+        'num_transactions': len(df_cat),
+        'num_categories': len(grouped),
+        'category_spending': category_spending,
+        'category_counts': category_counts,
+        'total_amount': total_amount,
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_balance': total_income - total_expenses,
+        'top_expenses': expense_rows.nlargest(top_n, 'amount'),
+        'avg_confidence': float(confidence.mean()) if len(confidence) else 0.0,
+        'min_confidence': float(confidence.min()) if len(confidence) else 0.0,
+        'low_confidence_count': int((confidence < LOW_CONFIDENCE_THRESHOLD).sum()),
+        'period_rollups': build_period_rollups(df_cat),
+    }
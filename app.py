@@ -1,12 +1,15 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import datetime
 
-from model_utils import load_model, predict_category_enhanced, predict_with_transaction_type
-from file_processors import process_csv_file, process_excel_file
+from model_utils import load_model, load_fast_model, find_uncached_descriptions
+from fast_classifier import DEFAULT_CASCADE_THRESHOLD
+from file_processors import process_uploaded_files
 from recommendations import generate_recommendations
-from pdf_generator import generate_expense_report
+from aggregations import summarize_transactions, period_expense_table
+from deduplication import remove_seen_transactions
+from pdf_generator import generate_expense_report, PdfReportFile
+from background_jobs import CategorizationJob, categorize_dataframe
 
 st.set_page_config(
     page_title="TransactAI : Personal Expense Categorization",
@@ -21,15 +24,129 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+PROGRESS_POLL_SECONDS = 0.5
+
+def cancel_categorization_job():
+    job = st.session_state.pop('categorization_job', None)
+    if job is not None:
+        job.cancel()
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def show_categorization_progress():
+    job = st.session_state.get('categorization_job')
+    if job is None:
+        return
+    if job.is_running():
+        st.progress(job.progress())
+        col1, col2 = st.columns([4, 1])
+        col1.text(f"Classifying unique descriptions: {job.processed}/{job.total}")
+        if col2.button("⏹️ Cancel", use_container_width=True, key='cancel_categorization'):
+            job.cancel()
+        return
+    del st.session_state['categorization_job']
+    if job.status == 'done':
+        st.session_state['categorized_df'] = job.result
+        st.session_state['description_col'] = job.description_col
+        st.session_state['categorization_mapping'] = job.mapping
+        st.session_state['categorization_message'] = ('success', "✅ Complete!")
+    elif job.status == 'cancelled':
+        st.session_state['categorization_message'] = ('warning', "Categorization cancelled.")
+    else:
+        st.session_state['categorization_message'] = ('error', f"Error during categorization: {job.error}")
+    st.rerun()
+
+def cascade_settings(fast_model):
+    if fast_model is not None and st.session_state.get('cascade_mode'):
+        return fast_model, st.session_state.get('cascade_threshold', DEFAULT_CASCADE_THRESHOLD)
+    return None, None
+
+def get_probability_cache(cascade_threshold):
+    # Cascade runs store fast-model probabilities for easy descriptions, so each
+    # threshold gets its own cache and never mixes with transformer-only results.
+    cache_key = 'transformer' if cascade_threshold is None else f'cascade@{cascade_threshold:.2f}'
+    return st.session_state['probability_caches'].setdefault(cache_key, {})
+
+def drop_stale_cascade_caches(fast_model):
+    # Cascade caches hold the fast model's own probabilities, so a refitted model
+    # invalidates them; transformer-only results are unaffected and kept.
+    if st.session_state.get('cascade_model') is not fast_model:
+        caches = st.session_state['probability_caches']
+        for cache_key in [key for key in caches if key.startswith('cascade@')]:
+            del caches[cache_key]
+        st.session_state['cascade_model'] = fast_model
+
+def store_categorized_df(df, description_col, withdrawal_col, deposit_col, date_col, probability_cache, id_map):
+    st.session_state['categorized_df'] = categorize_dataframe(
+        df.copy(), description_col, withdrawal_col, deposit_col, date_col, probability_cache, id_map
+    )
+    st.session_state['description_col'] = description_col
+    st.session_state['categorization_mapping'] = (description_col, withdrawal_col, deposit_col, date_col)
+
+def remove_duplicate_uploads(df, description_col, withdrawal_col, deposit_col, date_col):
+    drop = st.session_state.get('drop_duplicates', True)
+    df, duplicate_count = remove_seen_transactions(
+        df, description_col, withdrawal_col, deposit_col, date_col,
+        st.session_state['fingerprint_index'], df['source_id'], drop=drop
+    )
+    st.session_state['duplicate_summary'] = (duplicate_count, drop)
+    return df
+
+def get_transaction_analysis(df_cat):
+    cached = st.session_state.get('transaction_analysis')
+    if cached is None or cached[0] is not df_cat:
+        summary = summarize_transactions(df_cat)
+        cached = (df_cat, summary, generate_recommendations(summary))
+        st.session_state['transaction_analysis'] = cached
+    return cached[1], cached[2]
+
+def discard_pdf_report():
+    cached = st.session_state.pop('pdf_report', None)
+    if cached is not None and isinstance(cached[2], PdfReportFile):
+        cached[2].discard()
+
+def get_pdf_report(df_cat, full_appendix):
+    cached = st.session_state.get('pdf_report')
+    if cached is not None and (cached[0] is not df_cat or cached[1] != full_appendix):
+        discard_pdf_report()
+        return None
+    return None if cached is None else cached[2]
+
+def build_pdf_report(df_cat, recommendations, summary, description_col, full_appendix):
+    with st.spinner("Building PDF report..."):
+        report = generate_expense_report(df_cat, recommendations, summary, description_col,
+                                         full_appendix=full_appendix)
+    if isinstance(report, str):
+        report = PdfReportFile(report)
+    st.session_state['pdf_report'] = (df_cat, full_appendix, report)
+    return report
+
+def pdf_download_button(data):
+    st.download_button(
+        "📄 Download PDF Report",
+        data,
+        f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+        "application/pdf",
+        type="primary",
+        use_container_width=True
+    )
+
 def main():
     if 'reset_counter' not in st.session_state:
         st.session_state.reset_counter = 0
+    if 'probability_caches' not in st.session_state:
+        st.session_state['probability_caches'] = {}
+    if 'fingerprint_index' not in st.session_state:
+        st.session_state['fingerprint_index'] = {}
+    if 'token_cache' not in st.session_state:
+        st.session_state['token_cache'] = {}
 
     st.title("💰 TransactAI : Personal Expense Categorization System")
     st.markdown("### AI-Powered Bank Statement Analysis")
 
     with st.spinner("Loading AI model..."):
         model, tokenizer, device, config = load_model()
+        fast_model = load_fast_model()
+    drop_stale_cascade_caches(fast_model)
 
     if model is None:
         st.error("❌ Model not found.")
@@ -39,38 +156,32 @@ def main():
     id_map = config['id_map']
     categories = config['categories']
 
-    st.subheader("📁 Upload Bank Statement")
-    uploaded_file = st.file_uploader(
-        "Choose CSV or Excel file",
+    st.subheader("📁 Upload Bank Statements")
+    uploaded_files = st.file_uploader(
+        "Choose CSV or Excel files",
         type=['csv', 'xlsx', 'xls'],
-        help="Upload bank statement in CSV or Excel format",
+        accept_multiple_files=True,
+        help="Upload one or more bank statements in CSV or Excel format",
         key=f'file_uploader_{st.session_state.reset_counter}'
     )
 
-    if uploaded_file is not None:
-        if 'uploaded_file_name' not in st.session_state:
-            st.session_state['uploaded_file_name'] = uploaded_file.name
-        elif st.session_state['uploaded_file_name'] != uploaded_file.name:
+    if uploaded_files:
+        upload_key = tuple((f.name, getattr(f, 'file_id', None)) for f in uploaded_files)
+        if 'upload_key' not in st.session_state:
+            st.session_state['upload_key'] = upload_key
+        elif st.session_state['upload_key'] != upload_key:
+            cancel_categorization_job()
             if 'categorized_df' in st.session_state:
                 del st.session_state['categorized_df']
             if 'description_col' in st.session_state:
                 del st.session_state['description_col']
-            st.session_state['uploaded_file_name'] = uploaded_file.name
+            st.session_state.pop('parsed_upload', None)
+            st.session_state['upload_key'] = upload_key
 
-        file_extension = uploaded_file.name.split('.')[-1].lower()
-
-        df = None
-        description_col = None
-        withdrawal_col = None
-        deposit_col = None
-        date_col = None
-
-        if file_extension == 'csv':
-            with st.spinner("Processing CSV..."):
-                df, description_col, withdrawal_col, deposit_col, date_col = process_csv_file(uploaded_file)
-        elif file_extension in ['xlsx', 'xls']:
-            with st.spinner("Processing Excel..."):
-                df, description_col, withdrawal_col, deposit_col, date_col = process_excel_file(uploaded_file)
+        if 'parsed_upload' not in st.session_state:
+            with st.spinner(f"Processing {len(uploaded_files)} file(s)..."):
+                st.session_state['parsed_upload'] = process_uploaded_files(uploaded_files)
+        df, description_col, withdrawal_col, deposit_col, date_col = st.session_state['parsed_upload']
 
         if df is not None and description_col:
             with st.expander("📋 Preview Data"):
@@ -111,81 +222,80 @@ def main():
                     date_idx = date_options.index(date_col) if date_col in date_options else 0
                     date_col = st.selectbox("Date", date_options, index=date_idx)
 
+            st.checkbox("Skip transactions already seen in earlier uploads", value=True, key='drop_duplicates',
+                        help="Matches on date, description, amount and direction. When unchecked, "
+                             "repeats are kept but flagged and left out of totals.",
+                        disabled=date_col is None)
+            if fast_model is not None:
+                col1, col2 = st.columns(2)
+                col1.toggle("⚡ Fast mode", key='cascade_mode',
+                            help="Classify easy descriptions with a lightweight n-gram model and send "
+                                 "only low-confidence ones to DistilBERT.")
+                col2.slider("Fast-path confidence threshold", 0.5, 0.99, DEFAULT_CASCADE_THRESHOLD, 0.01,
+                            key='cascade_threshold', disabled=not st.session_state.get('cascade_mode'))
+
             st.markdown("---")
-            if st.button("🚀 Categorize Transactions", type="primary", use_container_width=True):
-                with st.spinner("Categorizing with AI..."):
-                    categories_pred = []
-                    confidences = []
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-
-                    for idx, row in df.iterrows():
-                        desc = row[description_col]
-                        if withdrawal_col and deposit_col:
-                            withdrawal = row[withdrawal_col] if pd.notna(row[withdrawal_col]) else 0
-                            deposit = row[deposit_col] if pd.notna(row[deposit_col]) else 0
-                            category, confidence = predict_with_transaction_type(
-                                desc, withdrawal, deposit, model, tokenizer, device, id_map
-                            )
-                        else:
-                            category, confidence = predict_category_enhanced(
-                                desc, model, tokenizer, device, id_map
-                            )
-                        categories_pred.append(category)
-                        confidences.append(confidence)
-                        progress = (idx + 1) / len(df)
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing: {idx + 1}/{len(df)}")
-
-                    df['category'] = categories_pred
-                    df['confidence'] = confidences
-
-                    def safe_convert_amount(value):
-                        if pd.isna(value):
-                            return 0.0
-                        val_str = str(value).strip()
-                        if '*' in val_str or val_str == '':
-                            return 0.0
-                        try:
-                            cleaned = val_str.replace(',', '').replace('₹', '').replace('Rs', '')
-                            return abs(float(cleaned))
-                        except:
-                            return 0.0
-
-                    if withdrawal_col and deposit_col:
-                        df['amount'] = df.apply(lambda row:
-                            safe_convert_amount(row[withdrawal_col]) + safe_convert_amount(row[deposit_col]), axis=1)
-                        df['transaction_type'] = df.apply(lambda row:
-                            'Expense' if safe_convert_amount(row[withdrawal_col]) > 0 else 'Income', axis=1)
-                    elif withdrawal_col:
-                        df['amount'] = df[withdrawal_col].apply(safe_convert_amount)
-                        df['transaction_type'] = 'Expense'
-                    elif deposit_col:
-                        df['amount'] = df[deposit_col].apply(safe_convert_amount)
-                        df['transaction_type'] = 'Income'
-                    else:
-                        df['amount'] = 0
-                        df['transaction_type'] = 'Unknown'
-
-                    st.session_state['categorized_df'] = df
-                    st.session_state['description_col'] = description_col
-
-                    st.success("✅ Complete!")
+            mapping = (description_col, withdrawal_col, deposit_col, date_col)
+            active_fast_model, cascade_threshold = cascade_settings(fast_model)
+            probability_cache = get_probability_cache(cascade_threshold)
+            if st.button("🚀 Categorize Transactions", type="primary", use_container_width=True,
+                         disabled='categorization_job' in st.session_state):
+                st.session_state.pop('categorized_df', None)
+                df = remove_duplicate_uploads(df, description_col, withdrawal_col, deposit_col, date_col)
+                if find_uncached_descriptions(df[description_col].tolist(), probability_cache):
+                    st.session_state['categorization_job'] = CategorizationJob(
+                        df.copy(), description_col, withdrawal_col, deposit_col, date_col, model, tokenizer, device, id_map,
+                        probability_cache, fast_model=active_fast_model, cascade_threshold=cascade_threshold,
+                        token_cache=st.session_state['token_cache']
+                    ).start()
+                else:
+                    store_categorized_df(df, description_col, withdrawal_col, deposit_col, date_col, probability_cache, id_map)
+                    st.session_state['categorization_message'] = ('success', "✅ Complete!")
+            elif ('categorized_df' in st.session_state and 'categorization_job' not in st.session_state
+                  and st.session_state.get('categorization_mapping') != mapping):
+                # Dedup only removes rows, so checking the cache on the raw upload is enough
+                # and avoids fingerprinting on every rerun while the mapping is still in flux.
+                if find_uncached_descriptions(df[description_col].tolist(), probability_cache):
+                    st.info("Column mapping changed. Click Categorize to classify the new descriptions.")
+                else:
+                    df = remove_duplicate_uploads(df, description_col, withdrawal_col, deposit_col, date_col)
+                    store_categorized_df(df, description_col, withdrawal_col, deposit_col, date_col, probability_cache, id_map)
+
+            if 'categorization_job' in st.session_state:
+                show_categorization_progress()
+
+            if 'categorization_message' in st.session_state:
+                level, message = st.session_state.pop('categorization_message')
+                if level == 'success':
+                    st.success(message)
                     st.balloons()
+                elif level == 'warning':
+                    st.warning(message)
+                else:
+                    st.error(message)
 
             if 'categorized_df' in st.session_state:
                 df_cat = st.session_state['categorized_df']
+                summary, recommendations = get_transaction_analysis(df_cat)
                 st.markdown("---")
                 st.subheader("📊 Results")
                 col1, col2, col3, col4 = st.columns(4)
-                col1.metric("Transactions", len(df_cat))
-                col2.metric("Categories", df_cat['category'].nunique())
-                col3.metric("Avg Confidence", f"{df_cat['confidence'].mean():.1%}")
-                col4.metric("Total", f"₹{df_cat['amount'].sum():,.0f}")
+                col1.metric("Transactions", summary['num_transactions'])
+                col2.metric("Categories", summary['num_categories'])
+                col3.metric("Avg Confidence", f"{summary['avg_confidence']:.1%}")
+                col4.metric("Total", f"₹{summary['total_amount']:,.0f}")
+                duplicate_count, dropped = st.session_state.get('duplicate_summary', (0, True))
+                if duplicate_count:
+                    action = "skipped" if dropped else "flagged and excluded from totals"
+                    st.info(f"{duplicate_count:,} transactions already seen in earlier uploads were {action}.")
 
                 tab1, tab2, tab3 = st.tabs(["📋 Data", "📊 Charts", "🎯 Insights"])
                 with tab1:
                     display_cols = [st.session_state['description_col'], 'category', 'amount', 'confidence']
+                    if len(uploaded_files) > 1:
+                        display_cols.append('source_file')
+                    if 'is_duplicate' in df_cat.columns:
+                        display_cols.append('is_duplicate')
                     display_df = df_cat[display_cols].copy()
                     display_df['confidence'] = display_df['confidence'].apply(lambda x: f"{x:.1%}")
                     display_df['amount'] = display_df['amount'].apply(lambda x: f"₹{x:,.2f}")
@@ -193,25 +303,36 @@ def main():
                 with tab2:
                     col1, col2 = st.columns(2)
                     with col1:
-                        category_counts = df_cat['category'].value_counts()
+                        category_counts = summary['category_counts']
                         fig = px.pie(values=category_counts.values, names=category_counts.index,
                                      title="Transaction Distribution")
                         st.plotly_chart(fig, use_container_width=True)
                     with col2:
-                        if df_cat['amount'].sum() > 0:
-                            cat_amt = df_cat.groupby('category')['amount'].sum().sort_values()
+                        if summary['total_amount'] > 0:
+                            cat_amt = summary['category_spending'].sort_values()
                             fig = px.bar(x=cat_amt.values, y=cat_amt.index, orientation='h',
                                          title="Spending by Category", labels={'x': '₹', 'y': ''})
                             st.plotly_chart(fig, use_container_width=True)
-                    if df_cat['amount'].sum() > 0:
+                    if summary['period_rollups'] is not None:
+                        st.markdown("### 📅 Spending Over Time")
+                        period = st.radio("Period", ['monthly', 'weekly'], format_func=str.title,
+                                          horizontal=True, key='rollup_period')
+                        period_expenses = period_expense_table(summary['period_rollups'], period)
+                        if not period_expenses.empty:
+                            period_long = period_expenses.rename_axis('period').reset_index().melt(
+                                id_vars='period', var_name='category', value_name='amount')
+                            fig = px.bar(period_long, x='period', y='amount', color='category',
+                                         title=f"{period.title()} Expenses by Category",
+                                         labels={'amount': '₹', 'period': ''})
+                            st.plotly_chart(fig, use_container_width=True)
+                    if summary['total_amount'] > 0:
                         st.markdown("### 💸 Top 10 Expenses")
-                        top = df_cat[df_cat['category'] != 'Income'].nlargest(10, 'amount')
+                        top = summary['top_expenses']
                         if len(top) > 0:
                             top_display = top[[st.session_state['description_col'], 'category', 'amount']].copy()
                             top_display['amount'] = top_display['amount'].apply(lambda x: f"₹{x:,.2f}")
                             st.dataframe(top_display, use_container_width=True, hide_index=True)
                 with tab3:
-                    recommendations, category_spending = generate_recommendations(df_cat)
                     if recommendations:
                         for rec in recommendations:
                             if rec['type'] == 'warning':
@@ -225,12 +346,9 @@ def main():
                     st.markdown("---")
                     st.markdown("### 📈 Summary")
                     col1, col2, col3 = st.columns(3)
-                    expenses = df_cat[df_cat['category'] != 'Income']['amount'].sum()
-                    income = df_cat[df_cat['category'] == 'Income']['amount'].sum()
-                    balance = income - expenses
-                    col1.metric("Expenses", f"₹{expenses:,.2f}")
-                    col2.metric("Income", f"₹{income:,.2f}")
-                    col3.metric("Balance", f"₹{balance:,.2f}")
+                    col1.metric("Expenses", f"₹{summary['total_expenses']:,.2f}")
+                    col2.metric("Income", f"₹{summary['total_income']:,.2f}")
+                    col3.metric("Balance", f"₹{summary['net_balance']:,.2f}")
                 st.markdown("---")
                 st.subheader("💾 Export")
                 col1, col2 = st.columns(2)
@@ -244,24 +362,32 @@ def main():
                         use_container_width=True
                     )
                 with col2:
-                    recs, cat_spend = generate_recommendations(df_cat)
                     desc_col_name = st.session_state.get('description_col', 'description')
-                    pdf_buffer = generate_expense_report(df_cat, recs, cat_spend, desc_col_name)
-                    st.download_button(
-                        "📄 Download PDF Report",
-                        pdf_buffer,
-                        f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                        "application/pdf",
-                        type="primary",
-                        use_container_width=True
+                    full_appendix = st.checkbox(
+                        "Include full transaction appendix", key='pdf_full_appendix',
+                        help="Lists every transaction in the PDF. Large statements take longer to build "
+                             "and produce large files."
                     )
+                    pdf_report = get_pdf_report(df_cat, full_appendix)
+                    if pdf_report is None and st.button("📄 Build PDF Report", use_container_width=True):
+                        pdf_report = build_pdf_report(df_cat, recommendations, summary, desc_col_name, full_appendix)
+                    if isinstance(pdf_report, PdfReportFile):
+                        # download_button copies the whole file into Streamlit's in-memory
+                        # media store; the temp file only keeps it out of session state.
+                        with open(pdf_report.path, 'rb') as pdf_file:
+                            pdf_download_button(pdf_file)
+                    elif pdf_report is not None:
+                        pdf_download_button(pdf_report)
                 st.markdown("---")
                 col1, col2, col3 = st.columns([1, 1, 1])
                 with col2:
                     if st.button("🔄 Upload New File", use_container_width=True, type="secondary",
                                  key=f'reset_btn_{st.session_state.reset_counter}'):
+                        cancel_categorization_job()
+                        discard_pdf_report()
                         st.session_state.reset_counter += 1
-                        keys_to_keep = ['reset_counter']
+                        keys_to_keep = ['reset_counter', 'probability_caches', 'fingerprint_index', 'token_cache',
+                                        'cascade_model']
                         for key in list(st.session_state.keys()):
                             if key not in keys_to_keep:
                                 del st.session_state[key]
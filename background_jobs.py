@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+from model_utils import fill_probability_cache, categorize_from_cache
+from file_processors import add_amount_columns, parse_transaction_dates
+
+@st.cache_resource
+def get_job_executor():
+    # Threads rather than processes: the loaded model is shared with the worker and
+    # torch releases the GIL during inference, so the Streamlit script stays responsive.
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='categorize')
+
+def categorize_dataframe(df, description_col, withdrawal_col, deposit_col, date_col, probability_cache, id_map):
+    df['category'], df['confidence'] = categorize_from_cache(
+        df, description_col, withdrawal_col, deposit_col, probability_cache, id_map
+    )
+    if date_col:
+        df['transaction_date'] = parse_transaction_dates(df[date_col], df.get('source_file'))
+    return add_amount_columns(df, withdrawal_col, deposit_col)
+
+class CategorizationJob:
+    def __init__(self, df, description_col, withdrawal_col, deposit_col, date_col, model, tokenizer, device, id_map,
+                 probability_cache, fast_model=None, cascade_threshold=None, token_cache=None):
+        self.df = df
+        self.description_col = description_col
+        self.withdrawal_col = withdrawal_col
+        self.deposit_col = deposit_col
+        self.date_col = date_col
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.id_map = id_map
+        self.probability_cache = probability_cache
+        self.fast_model = fast_model
+        self.cascade_threshold = cascade_threshold
+        self.token_cache = token_cache
+        self.total = 0
+        self.processed = 0
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def mapping(self):
+        return self.description_col, self.withdrawal_col, self.deposit_col, self.date_col
+
+    def start(self):
+        self.status = 'running'
+        get_job_executor().submit(self._run)
+        return self
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_running(self):
+        return self.status in ('pending', 'running')
+
+    def progress(self):
+        return self.processed / self.total if self.total else 0.0
+
+    def _on_progress(self, processed, total):
+        self.processed = processed
+        self.total = total
+
+    def _run(self):
+        try:
+            completed = fill_probability_cache(
+                self.df[self.description_col].tolist(), self.probability_cache,
+                self.model, self.tokenizer, self.device,
+                on_progress=self._on_progress, should_stop=self._cancel_event.is_set,
+                fast_model=self.fast_model, cascade_threshold=self.cascade_threshold,
+                token_cache=self.token_cache
+            )
+            if not completed:
+                self.status = 'cancelled'
+                return
+            self.result = categorize_dataframe(
+                self.df, self.description_col, self.withdrawal_col, self.deposit_col, self.date_col,
+                self.probability_cache, self.id_map
+            )
+            self.status = 'done'
+        except Exception as e:
+            self.error = e
+            self.status = 'error'
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from file_processors import parse_amount_series, parse_transaction_dates
+
+def transaction_fingerprints(df, description_col, withdrawal_col, deposit_col, date_col, sources=None):
+    zeros = pd.Series(0.0, index=df.index)
+    withdrawals = parse_amount_series(df[withdrawal_col]) if withdrawal_col else zeros
+    deposits = parse_amount_series(df[deposit_col]) if deposit_col else zeros
+    # Normalize and hash each distinct description once, then broadcast the hashes to rows.
+    codes, unique_descriptions = pd.factorize(df[description_col].astype(str))
+    normalized = pd.Series(unique_descriptions).str.lower().str.replace(r'\s+', ' ', regex=True).str.strip()
+    description_hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+    dates = parse_transaction_dates(df[date_col], sources).dt.normalize()
+    keys = pd.DataFrame({
+        'date': dates,
+        'description': description_hashes[codes],
+        'amount': (withdrawals + deposits).round(2),
+        'direction': np.where(withdrawals > 0, 1, np.where(deposits > 0, -1, 0)).astype(np.int8),
+    }, index=df.index)
+    # Identical transactions on the same day are legitimate, so the n-th repeat within a
+    # statement only matches the n-th repeat in another statement.
+    group_keys = ['date', 'description', 'amount', 'direction']
+    if sources is not None:
+        group_keys.append(pd.Series(sources, index=df.index))
+    keys['occurrence'] = keys.groupby(group_keys, dropna=False).cumcount()
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(), dates.notna().to_numpy()
+
+def find_duplicates(fingerprints, fingerprint_index, source):
+    return np.fromiter(
+        (fingerprint_index.get(fingerprint, source) != source for fingerprint in fingerprints.tolist()),
+        dtype=bool, count=len(fingerprints)
+    )
+
+def register_fingerprints(fingerprints, fingerprint_index, source):
+    for fingerprint in fingerprints.tolist():
+        fingerprint_index.setdefault(fingerprint, source)
+
+def remove_seen_transactions(df, description_col, withdrawal_col, deposit_col, date_col, fingerprint_index, source,
+                             drop=True):
+    if not date_col:
+        return df, 0
+    # source is either one id for the whole frame or a per-row Series (e.g. source_id).
+    # Files are checked in order, so overlapping files in one upload also catch each other.
+    sources = pd.Series(source, index=df.index)
+    fingerprints, dated = transaction_fingerprints(df, description_col, withdrawal_col, deposit_col, date_col, sources)
+    duplicates = np.zeros(len(df), dtype=bool)
+    # Without a date only description and amount are left, which would match every
+    # recurring payment (rent, EMIs, subscriptions), so undated rows are never compared.
+    dated_positions = np.flatnonzero(dated)
+    dated_sources = sources.iloc[dated_positions]
+    for source_name, group in dated_sources.groupby(dated_sources, sort=False).indices.items():
+        positions = dated_positions[group]
+        source_fingerprints = fingerprints[positions]
+        source_duplicates = find_duplicates(source_fingerprints, fingerprint_index, source_name)
+        register_fingerprints(source_fingerprints[~source_duplicates], fingerprint_index, source_name)
+        duplicates[positions] = source_duplicates
+    if drop:
+        return df[~duplicates].reset_index(drop=True), int(duplicates.sum())
+    return df.assign(is_duplicate=duplicates), int(duplicates.sum())
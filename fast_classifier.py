@@ -0,0 +1,40 @@
+import os
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+FAST_MODEL_PATH = 'fast_model.joblib'
+DEFAULT_CASCADE_THRESHOLD = 0.9
+
+def build_fast_classifier():
+    return make_pipeline(
+        HashingVectorizer(analyzer='char_wb', ngram_range=(2, 4), n_features=2 ** 18,
+                          alternate_sign=False, lowercase=True),
+        LogisticRegression(C=10.0, max_iter=1000)
+    )
+
+def fit_fast_classifier(descriptions, label_ids):
+    classifier = build_fast_classifier()
+    classifier.fit([str(desc) for desc in descriptions], label_ids)
+    return classifier
+
+def save_fast_classifier(classifier, path=FAST_MODEL_PATH):
+    joblib.dump(classifier, path)
+
+def load_fast_classifier(path=FAST_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path)
+
+def fast_probabilities(classifier, descriptions, num_labels):
+    # The classifier only knows the labels it was trained on; spread its columns into
+    # the transformer's label order so both stages produce interchangeable vectors.
+    probs = np.zeros((len(descriptions), num_labels), dtype=np.float32)
+    if len(descriptions):
+        probs[:, classifier.classes_] = classifier.predict_proba([str(desc) for desc in descriptions])
+    return probs
+
+def split_by_confidence(probs, threshold):
+    return probs.max(axis=1) >= threshold
@@ -1,132 +1,260 @@
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+def read_csv_statement(uploaded_file):
+    df = pd.read_csv(uploaded_file)
+    description_col = None
+    withdrawal_col = None
+    deposit_col = None
+    date_col = None
+
+    for col in df.columns:
+        col_lower = col.lower()
+        if any(keyword in col_lower for keyword in ['description', 'particulars', 'narration', 'details', 'transaction', 'remark']):
+            if description_col is None:
+                description_col = col
+        elif any(keyword in col_lower for keyword in ['withdrawal', 'debit', 'withdraw', 'dr', 'spent']):
+            if withdrawal_col is None:
+                withdrawal_col = col
+        elif any(keyword in col_lower for keyword in ['deposit', 'credit', 'cr', 'received']):
+            if deposit_col is None:
+                deposit_col = col
+        elif any(keyword in col_lower for keyword in ['date', 'transaction date', 'value date', 'txn date']):
+            if date_col is None:
+                date_col = col
+
+    if description_col is None:
+        description_col = df.columns[0]
+    return df, description_col, withdrawal_col, deposit_col, date_col
+
 def process_csv_file(uploaded_file):
     try:
-        df = pd.read_csv(uploaded_file)
-        description_col = None
-        withdrawal_col = None
-        deposit_col = None
-        date_col = None
-
-        for col in df.columns:
-            col_lower = col.lower()
-            if any(keyword in col_lower for keyword in ['description', 'particulars', 'narration', 'details', 'transaction', 'remark']):
-                if description_col is None:
-                    description_col = col
-            elif any(keyword in col_lower for keyword in ['withdrawal', 'debit', 'withdraw', 'dr', 'spent']):
+        return read_csv_statement(uploaded_file)
+    except Exception as e:
+        st.error(f"Error processing CSV: {e}")
+        return None, None, None, None, None
+
+def read_excel_statement(uploaded_file):
+    try:
+        df = pd.read_excel(uploaded_file, engine='openpyxl')
+    except:
+        uploaded_file.seek(0)
+        df = pd.read_excel(uploaded_file, engine='xlrd')
+
+    header_row = None
+    for idx in range(min(50, len(df))):
+        row = df.iloc[idx]
+        row_str = ' '.join([str(x).lower() for x in row if pd.notna(x)])
+        if any(date_word in row_str for date_word in ['date', 'txn date', 'trans date', 'posting date']):
+            if any(desc_word in row_str for desc_word in ['narration', 'description', 'particulars', 'details', 'transaction']):
+                header_row = idx
+                break
+
+    if header_row is not None:
+        new_columns = []
+        col_counter = {}
+        for col in df.iloc[header_row]:
+            col_str = str(col).strip()
+            if pd.isna(col) or col_str == '' or col_str.lower() == 'nan':
+                col_str = f'Unnamed_{len(new_columns)}'
+            if col_str in col_counter:
+                col_counter[col_str] += 1
+                col_str = f"{col_str}_{col_counter[col_str]}"
+            else:
+                col_counter[col_str] = 0
+            new_columns.append(col_str)
+        df.columns = new_columns
+        df = df.iloc[header_row + 1:].reset_index(drop=True)
+
+    def is_definitely_not_transaction(row):
+        text_vals = [str(val).lower() for val in row if pd.notna(val)]
+        if len(text_vals) == 0:
+            return True
+        text_str = ' '.join(text_vals)
+        definite_bad = [
+            'statement summary', 'end of statement',
+            'opening balance as on', 'closing balance as on',
+            'opening balance','closing balance',
+            'page no', 'branch address', 'registered office',
+            'account number:', 'customer id:', 'ifsc code:',
+            'swift code:', 'micr code:', 'email id:',
+            'joint holder', 'nomination:', 'scheme:',
+            'communication address', 'regd. mobile',
+            'effective available balance', 'date of issue',
+            'grand total', 'generated on:', 'branch code'
+        ]
+        return any(keyword in text_str for keyword in definite_bad)
+
+    df = df[~df.apply(is_definitely_not_transaction, axis=1)]
+    df = df.dropna(how='all')
+    df = df.reset_index(drop=True)
+
+    description_col = None
+    withdrawal_col = None
+    deposit_col = None
+    date_col = None
+
+    for col in df.columns:
+        col_lower = str(col).lower().strip()
+        if 'unnamed' in col_lower:
+            continue
+        if any(keyword in col_lower for keyword in ['narration', 'description', 'particulars', 'details', 'transaction']):
+            if description_col is None:
+                description_col = col
+        elif any(keyword in col_lower for keyword in ['withdrawal', 'debit', 'withdraw', 'dr', 'paid']):
+            if 'cheque' not in col_lower and 'ref' not in col_lower:
                 if withdrawal_col is None:
                     withdrawal_col = col
-            elif any(keyword in col_lower for keyword in ['deposit', 'credit', 'cr', 'received']):
-                if deposit_col is None:
-                    deposit_col = col
-            elif any(keyword in col_lower for keyword in ['date', 'transaction date', 'value date', 'txn date']):
+        elif any(keyword in col_lower for keyword in ['deposit', 'credit', 'cr', 'received']):
+            if deposit_col is None:
+                deposit_col = col
+        elif any(keyword in col_lower for keyword in ['date', 'transaction date', 'value date', 'txn date', 'posting']):
+            if 'from' not in col_lower and 'to' not in col_lower:
                 if date_col is None:
                     date_col = col
 
-        if description_col is None:
-            description_col = df.columns[0]
-        return df, description_col, withdrawal_col, deposit_col, date_col
+    if description_col and description_col in df.columns:
+        df = df[df[description_col].notna()]
+        df = df[df[description_col].astype(str).str.strip() != '']
+        df = df[df[description_col].astype(str).str.len() > 1]
+        df = df[df[description_col].apply(lambda x: str(x).count('*') < len(str(x)) * 0.8)]
 
-    except Exception as e:
-        st.error(f"Error processing CSV: {e}")
-        return None, None, None, None, None
+    if withdrawal_col and withdrawal_col in df.columns:
+        df = df[~df[withdrawal_col].apply(lambda x: pd.notna(x) and ('*' in str(x) or str(x).strip() == ''))]
+    if deposit_col and deposit_col in df.columns:
+        df = df[~df[deposit_col].apply(lambda x: pd.notna(x) and ('*' in str(x) or str(x).strip() == ''))]
+    df = df.drop_duplicates(keep='first')
+    df = df.reset_index(drop=True)
+
+    return df, description_col, withdrawal_col, deposit_col, date_col
 
 def process_excel_file(uploaded_file):
     try:
-        try:
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
-        except:
-            uploaded_file.seek(0)
-            df = pd.read_excel(uploaded_file, engine='xlrd')
-
-        header_row = None
-        for idx in range(min(50, len(df))):
-            row = df.iloc[idx]
-            row_str = ' '.join([str(x).lower() for x in row if pd.notna(x)])
-            if any(date_word in row_str for date_word in ['date', 'txn date', 'trans date', 'posting date']):
-                if any(desc_word in row_str for desc_word in ['narration', 'description', 'particulars', 'details', 'transaction']):
-                    header_row = idx
-                    break
-
-        if header_row is not None:
-            new_columns = []
-            col_counter = {}
-            for col in df.iloc[header_row]:
-                col_str = str(col).strip()
-                if pd.isna(col) or col_str == '' or col_str.lower() == 'nan':
-                    col_str = f'Unnamed_{len(new_columns)}'
-                if col_str in col_counter:
-                    col_counter[col_str] += 1
-                    col_str = f"{col_str}_{col_counter[col_str]}"
-                else:
-                    col_counter[col_str] = 0
-                new_columns.append(col_str)
-            df.columns = new_columns
-            df = df.iloc[header_row + 1:].reset_index(drop=True)
-
-        def is_definitely_not_transaction(row):
-            text_vals = [str(val).lower() for val in row if pd.notna(val)]
-            if len(text_vals) == 0:
-                return True
-            text_str = ' '.join(text_vals)
-            definite_bad = [
-                'statement summary', 'end of statement',
-                'opening balance as on', 'closing balance as on',
-                'opening balance','closing balance',
-                'page no', 'branch address', 'registered office',
-                'account number:', 'customer id:', 'ifsc code:',
-                'swift code:', 'micr code:', 'email id:',
-                'joint holder', 'nomination:', 'scheme:',
-                'communication address', 'regd. mobile',
-                'effective available balance', 'date of issue',
-                'grand total', 'generated on:', 'branch code'
-            ]
-            return any(keyword in text_str for keyword in definite_bad)
-
-        df = df[~df.apply(is_definitely_not_transaction, axis=1)]
-        df = df.dropna(how='all')
-        df = df.reset_index(drop=True)
-
-        description_col = None
-        withdrawal_col = None
-        deposit_col = None
-        date_col = None
-
-        for col in df.columns:
-            col_lower = str(col).lower().strip()
-            if 'unnamed' in col_lower:
-                continue
-            if any(keyword in col_lower for keyword in ['narration', 'description', 'particulars', 'details', 'transaction']):
-                if description_col is None:
-                    description_col = col
-            elif any(keyword in col_lower for keyword in ['withdrawal', 'debit', 'withdraw', 'dr', 'paid']):
-                if 'cheque' not in col_lower and 'ref' not in col_lower:
-                    if withdrawal_col is None:
-                        withdrawal_col = col
-            elif any(keyword in col_lower for keyword in ['deposit', 'credit', 'cr', 'received']):
-                if deposit_col is None:
-                    deposit_col = col
-            elif any(keyword in col_lower for keyword in ['date', 'transaction date', 'value date', 'txn date', 'posting']):
-                if 'from' not in col_lower and 'to' not in col_lower:
-                    if date_col is None:
-                        date_col = col
-
-        if description_col and description_col in df.columns:
-            df = df[df[description_col].notna()]
-            df = df[df[description_col].astype(str).str.strip() != '']
-            df = df[df[description_col].astype(str).str.len() > 1]
-            df = df[df[description_col].apply(lambda x: str(x).count('*') < len(str(x)) * 0.8)]
-
-        if withdrawal_col and withdrawal_col in df.columns:
-            df = df[~df[withdrawal_col].apply(lambda x: pd.notna(x) and ('*' in str(x) or str(x).strip() == ''))]
-        if deposit_col and deposit_col in df.columns:
-            df = df[~df[deposit_col].apply(lambda x: pd.notna(x) and ('*' in str(x) or str(x).strip() == ''))]
-        df = df.drop_duplicates(keep='first')
-        df = df.reset_index(drop=True)
-
-        return df, description_col, withdrawal_col, deposit_col, date_col
-
+        return read_excel_statement(uploaded_file)
     except Exception as e:
         st.error(f"Error processing Excel: {str(e)}")
         return None, None, None, None, None
+
+def read_statement(uploaded_file):
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    if file_extension == 'csv':
+        return read_csv_statement(uploaded_file)
+    if file_extension in ['xlsx', 'xls']:
+        return read_excel_statement(uploaded_file)
+    raise ValueError(f"Unsupported file type: .{file_extension}")
+
+def combine_statements(statements):
+    # Each bank names its columns differently, so the detected columns of every file are
+    # renamed to the first detected name for that role before the frames are stacked.
+    # Date formats differ too, so each file's date column is parsed before stacking.
+    canonical = [None] * 4
+    for _, _, _, *detected in statements:
+        canonical = [current or col for current, col in zip(canonical, detected)]
+    frames = []
+    for file_name, source_id, df, *detected in statements:
+        date_col = detected[3]
+        if date_col:
+            df = df.assign(**{date_col: parse_transaction_dates(df[date_col])})
+        renames = {col: target for col, target in zip(detected, canonical)
+                   if col and col != target and target not in df.columns}
+        frames.append(df.rename(columns=renames).assign(source_file=file_name, source_id=source_id))
+    return (pd.concat(frames, ignore_index=True), *canonical)
+
+def upload_identity(uploaded_file):
+    # Banks reuse default export names, so uploads are told apart by Streamlit's file_id
+    # (or their content when there is none) rather than by name.
+    return getattr(uploaded_file, 'file_id', None) or hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+def read_statement_bytes(file_name, data):
+    uploaded_file = io.BytesIO(data)
+    uploaded_file.name = file_name
+    return read_statement(uploaded_file)
+
+@st.cache_resource
+def get_excel_executor():
+    # openpyxl/xlrd and the row filters above are pure Python and hold the GIL, so
+    # workbooks are parsed in processes. Workers only import this module (no torch) and
+    # the pool is kept, so they are spawned once per server rather than per upload.
+    return ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                               mp_context=multiprocessing.get_context('spawn'))
+
+def submit_statement(uploaded_file, thread_executor):
+    if uploaded_file.name.split('.')[-1].lower() in ['xlsx', 'xls']:
+        return get_excel_executor().submit(read_statement_bytes, uploaded_file.name, uploaded_file.getvalue())
+    # The CSV parser runs in C, so CSVs stay on threads and skip pickling frames back.
+    return thread_executor.submit(read_statement, uploaded_file)
+
+def process_uploaded_files(uploaded_files, max_workers=4):
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uploaded_files)))) as executor:
+        futures = [submit_statement(uploaded_file, executor) for uploaded_file in uploaded_files]
+    statements = []
+    for uploaded_file, future in zip(uploaded_files, futures):
+        try:
+            df, *detected = future.result()
+        except BrokenProcessPool as e:
+            get_excel_executor.clear()
+            st.error(f"Error processing {uploaded_file.name}: {e}")
+            continue
+        except Exception as e:
+            st.error(f"Error processing {uploaded_file.name}: {e}")
+            continue
+        if detected[0] is None:
+            st.warning(f"No description column found in {uploaded_file.name}; skipped.")
+            continue
+        statements.append((uploaded_file.name, upload_identity(uploaded_file), df, *detected))
+    if not statements:
+        return None, None, None, None, None
+    return combine_statements(statements)
+
+def parse_amount_series(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return values.abs().fillna(0.0).astype(float)
+    text = values.astype(str).str.strip()
+    cleaned = (text.str.replace(',', '', regex=False)
+               .str.replace('₹', '', regex=False)
+               .str.replace('Rs', '', regex=False)
+               .str.strip())
+    amounts = pd.to_numeric(cleaned, errors='coerce').abs()
+    invalid = values.isna() | text.str.contains('*', regex=False) | (text == '')
+    return amounts.mask(invalid, 0.0).fillna(0.0)
+
+def add_amount_columns(df, withdrawal_col, deposit_col):
+    if withdrawal_col and deposit_col:
+        withdrawals = parse_amount_series(df[withdrawal_col])
+        df['amount'] = withdrawals + parse_amount_series(df[deposit_col])
+        df['transaction_type'] = np.where(withdrawals > 0, 'Expense', 'Income')
+    elif withdrawal_col:
+        df['amount'] = parse_amount_series(df[withdrawal_col])
+        df['transaction_type'] = 'Expense'
+    elif deposit_col:
+        df['amount'] = parse_amount_series(df[deposit_col])
+        df['transaction_type'] = 'Income'
+    else:
+        df['amount'] = 0
+        df['transaction_type'] = 'Unknown'
+    return df
+
+def parse_date_values(values):
+    # dayfirst suits most statements but turns ISO dates into year-day-month, so an
+    # ISO reading wins whenever it parses at least as many rows.
+    iso_dates = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    if iso_dates.notna().sum() == values.notna().sum():
+        return iso_dates
+    day_first = pd.to_datetime(values, dayfirst=True, errors='coerce')
+    return iso_dates if iso_dates.notna().sum() >= day_first.notna().sum() else day_first
+
+def parse_transaction_dates(values, sources=None):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if sources is None or values.empty:
+        return parse_date_values(values)
+    # pandas infers one format per call, so a remapped date column is parsed per source file.
+    parts = [parse_date_values(group) for _, group in values.groupby(sources, sort=False)]
+    return pd.concat(parts).reindex(values.index)
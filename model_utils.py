@@ -1,24 +1,48 @@
 import torch
 from transformers import DistilBertTokenizerFast, DistilBertForSequenceClassification
 import json
+import os
+import pandas as pd
 import streamlit as st
 import re
 
+from fast_classifier import (DEFAULT_CASCADE_THRESHOLD, FAST_MODEL_PATH, fast_probabilities,
+                             load_fast_classifier, split_by_confidence)
+from tokenization import get_token_ids, pad_token_ids
+
+def load_model_components(model_dir="expense_model_distilbert", config_path='model_config.json'):
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    tokenizer = DistilBertTokenizerFast.from_pretrained(model_dir)
+    model.eval()
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = model.to(device)
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    return model, tokenizer, device, config
+
 @st.cache_resource
 def load_model():
     try:
-        model = DistilBertForSequenceClassification.from_pretrained("expense_model_distilbert")
-        tokenizer = DistilBertTokenizerFast.from_pretrained("expense_model_distilbert")
-        model.eval()
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        model = model.to(device)
-        with open('model_config.json', 'r') as f:
-            config = json.load(f)
-        return model, tokenizer, device, config
+        return load_model_components()
     except Exception as e:
         st.error(f"Error loading model: {e}")
         return None, None, None, None
 
+@st.cache_resource(max_entries=1)
+def load_fast_model_file(path, modified_time):
+    try:
+        return load_fast_classifier(path)
+    except Exception as e:
+        st.warning(f"Could not load fast model: {e}")
+        return None
+
+def load_fast_model(path=FAST_MODEL_PATH):
+    # Keyed on the file's mtime and never cached while missing, so a model fitted
+    # or refitted while the app runs is picked up on the next rerun.
+    if not os.path.exists(path):
+        return None
+    return load_fast_model_file(path, os.path.getmtime(path))
+
 def extract_transaction_features(description):
     desc_lower = str(description).lower()
     features = {
@@ -42,25 +66,42 @@ def extract_transaction_features(description):
     }
     return features
 
-def predict_category_enhanced(description, model, tokenizer, device, id_map):
+def description_key(description):
     if not description or str(description).strip() == '':
+        return None
+    return str(description)
+
+def predict_probabilities_from_tokens(token_arrays, model, device, batch_size=64):
+    pad_id = model.config.pad_token_id or 0
+    results = []
+    for start in range(0, len(token_arrays), batch_size):
+        input_ids, attention_mask = pad_token_ids(token_arrays[start:start + batch_size], pad_id)
+        with torch.no_grad():
+            outputs = model(input_ids=torch.from_numpy(input_ids).to(device),
+                            attention_mask=torch.from_numpy(attention_mask).to(device))
+            probs = torch.softmax(outputs.logits, dim=-1)
+        results.extend(probs.cpu().numpy())
+    return results
+
+def predict_probabilities(descriptions, model, tokenizer, device, batch_size=64, token_cache=None):
+    token_arrays = get_token_ids(descriptions, tokenizer, token_cache)
+    return predict_probabilities_from_tokens(token_arrays, model, device, batch_size)
+
+def predict_category_enhanced(description, model, tokenizer, device, id_map):
+    desc_key = description_key(description)
+    if desc_key is None:
+        return "Unknown", 0.0
+    probs = predict_probabilities([desc_key], model, tokenizer, device)[0]
+    return apply_category_rules(desc_key, probs, id_map)
+
+def apply_category_rules(description, probs, id_map):
+    desc_str = description_key(description)
+    if desc_str is None:
         return "Unknown", 0.0
-    desc_str = str(description)
     features = extract_transaction_features(desc_str)
-    inputs = tokenizer(
-        desc_str,
-        return_tensors='pt',
-        padding='max_length',
-        truncation=True,
-        max_length=32
-    )
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    with torch.no_grad():
-        outputs = model(**inputs)
-        probs = torch.softmax(outputs.logits, dim=-1)[0]
-        predicted_idx = probs.argmax().item()
-        confidence = probs[predicted_idx].item()
-        category = id_map[str(predicted_idx)]
+    predicted_idx = int(probs.argmax())
+    confidence = float(probs[predicted_idx])
+    category = id_map[str(predicted_idx)]
     desc_lower = desc_str.lower()
     if features['has_cash_deposit']:
         if features['has_credit_indicator'] or not features['has_debit_indicator']:
@@ -112,6 +153,9 @@ def predict_category_enhanced(description, model, tokenizer, device, id_map):
 
 def predict_with_transaction_type(description, withdrawal_amount, deposit_amount, model, tokenizer, device, id_map):
     category, confidence = predict_category_enhanced(description, model, tokenizer, device, id_map)
+    return apply_transaction_type_rules(description, category, confidence, withdrawal_amount, deposit_amount)
+
+def apply_transaction_type_rules(description, category, confidence, withdrawal_amount, deposit_amount):
     try:
         withdrawal = float(str(withdrawal_amount).replace(',', '')) if withdrawal_amount and str(
             withdrawal_amount).strip() not in ['', 'nan', 'None'] else 0
@@ -140,5 +184,72 @@ def predict_with_transaction_type(description, withdrawal_amount, deposit_amount
                 return "Shopping", 0.85
     return category, confidence
 
+def parse_signed_amounts(values):
+    text = values.astype(str).str.strip().str.replace(',', '', regex=False)
+    return pd.to_numeric(text, errors='coerce').fillna(0).tolist()
+
+def find_uncached_descriptions(descriptions, probability_cache):
+    pending = {}
+    for desc in descriptions:
+        desc_key = description_key(desc)
+        if desc_key is not None and desc_key not in probability_cache:
+            pending[desc_key] = None
+    return list(pending)
+
+def fill_probability_cache(descriptions, probability_cache, model, tokenizer, device,
+                           batch_size=64, on_progress=None, should_stop=None,
+                           fast_model=None, cascade_threshold=DEFAULT_CASCADE_THRESHOLD, token_cache=None):
+    pending = find_uncached_descriptions(descriptions, probability_cache)
+    if fast_model is not None and pending:
+        fast_probs = fast_probabilities(fast_model, pending, model.config.num_labels)
+        confident = split_by_confidence(fast_probs, cascade_threshold)
+        for desc_key, probs, is_confident in zip(pending, fast_probs, confident):
+            if is_confident:
+                probability_cache[desc_key] = probs
+        pending = [desc_key for desc_key, is_confident in zip(pending, confident) if not is_confident]
+    total = len(pending)
+    for start in range(0, total, batch_size):
+        if should_stop is not None and should_stop():
+            return False
+        batch = pending[start:start + batch_size]
+        for desc_key, probs in zip(batch, predict_probabilities(batch, model, tokenizer, device, batch_size,
+                                                                         token_cache)):
+            probability_cache[desc_key] = probs
+        if on_progress is not None:
+            on_progress(min(start + batch_size, total), total)
+    return True
+
+def categorize_from_cache(df, description_col, withdrawal_col, deposit_col, probability_cache, id_map):
+    descriptions = df[description_col].tolist()
+    category_results = {}
+    for desc in descriptions:
+        desc_key = description_key(desc)
+        if desc_key not in category_results:
+            if desc_key is None:
+                category_results[desc_key] = ("Unknown", 0.0)
+            else:
+                category_results[desc_key] = apply_category_rules(desc_key, probability_cache[desc_key], id_map)
+    if not (withdrawal_col and deposit_col):
+        results = [category_results[description_key(desc)] for desc in descriptions]
+    else:
+        # The transaction type overrides only look at the sign of each amount, so rows
+        # sharing a description and direction share a result.
+        withdrawals = parse_signed_amounts(df[withdrawal_col])
+        deposits = parse_signed_amounts(df[deposit_col])
+        results = []
+        override_results = {}
+        for desc, withdrawal, deposit in zip(descriptions, withdrawals, deposits):
+            desc_key = description_key(desc)
+            override_key = (desc_key, (withdrawal > 0) - (withdrawal < 0), (deposit > 0) - (deposit < 0))
+            if override_key not in override_results:
+                category, confidence = category_results[desc_key]
+                override_results[override_key] = apply_transaction_type_rules(
+                    desc, category, confidence, withdrawal, deposit
+                )
+            results.append(override_results[override_key])
+    categories_pred = [category for category, _ in results]
+    confidences = [confidence for _, confidence in results]
+    return categories_pred, confidences
+
 def predict_category(description, model, tokenizer, device, id_map):
     return predict_category_enhanced(description, model, tokenizer, device, id_map)
@@ -4,14 +4,35 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import matplotlib.pyplot as plt
 import matplotlib
 import io
+import os
+import tempfile
+import weakref
 
 matplotlib.use('Agg')
 
+APPENDIX_ROWS_PER_TABLE = 40
+APPENDIX_FORMAT_BLOCK = 5000
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+class PdfReportFile:
+    # Appendix reports live in a temp file; the finalizer deletes it when the session
+    # state holding it goes away (reset, rebuild or session end) and at interpreter exit.
+    def __init__(self, path):
+        self.path = path
+        self._cleanup = weakref.finalize(self, remove_file, path)
+
+    def discard(self):
+        self._cleanup()
+
 def create_clean_pie_chart(category_spending, title="Spending Distribution"):
     threshold = 0.03
     total = category_spending.sum()
@@ -70,8 +91,89 @@ def create_bar_chart(category_spending, title="Category-wise Spending"):
     plt.close()
     return img_buffer
 
-def generate_expense_report(df_categorized, recommendations, category_spending, description_col='description'):
-    pdf_buffer = io.BytesIO()
+def find_description_column(df, description_col):
+    if description_col in df.columns:
+        return description_col
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if any(keyword in col_lower for keyword in ['description', 'narration', 'particulars', 'details']):
+            return col
+    for col in df.columns:
+        if df[col].dtype == 'object' and col not in ['category', 'transaction_type']:
+            return col
+    return None
+
+def format_appendix_rows(block, desc_col, first_number):
+    columns = [pd.Series(np.arange(first_number, first_number + len(block)), index=block.index).astype(str)]
+    if 'transaction_date' in block.columns:
+        columns.append(block['transaction_date'].dt.strftime('%d-%m-%Y').fillna(''))
+    if desc_col:
+        desc = block[desc_col].astype(str)
+        columns.append(desc.where(desc.str.len() <= 45, desc.str[:45] + '...'))
+    else:
+        columns.append(pd.Series('N/A', index=block.index))
+    columns.append(block['category'].astype(str))
+    columns.append('Rs ' + block['amount'].map('{:,.2f}'.format))
+    return np.column_stack([col.to_numpy(dtype=object) for col in columns]).tolist()
+
+def appendix_flowables(df_categorized, description_col, heading_style):
+    desc_col = find_description_column(df_categorized, description_col)
+    has_dates = 'transaction_date' in df_categorized.columns
+    header = ['#', 'Date', 'Description', 'Category', 'Amount'] if has_dates else ['#', 'Description', 'Category', 'Amount']
+    col_widths = ([0.6 * inch, 0.9 * inch, 2.85 * inch, 1.2 * inch, 1.2 * inch] if has_dates
+                  else [0.6 * inch, 3.55 * inch, 1.4 * inch, 1.2 * inch])
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5f99')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+    ])
+    yield PageBreak()
+    yield Paragraph(f"Transaction Appendix ({len(df_categorized):,} transactions)", heading_style)
+    yield Spacer(1, 10)
+    # Strings are formatted one block at a time and tables are created only as the
+    # document consumes them, so rows are never all held as table flowables at once.
+    # reportlab still keeps every finished page until save, so peak memory grows with
+    # the row count, just more slowly.
+    for block_start in range(0, len(df_categorized), APPENDIX_FORMAT_BLOCK):
+        block = df_categorized.iloc[block_start:block_start + APPENDIX_FORMAT_BLOCK]
+        rows = format_appendix_rows(block, desc_col, block_start + 1)
+        for table_start in range(0, len(rows), APPENDIX_ROWS_PER_TABLE):
+            table = Table([header] + rows[table_start:table_start + APPENDIX_ROWS_PER_TABLE],
+                          colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            yield table
+
+class StreamingFlowables(list):
+    # platypus pops flowables off the front of the list it is given; topping the list up
+    # from a generator whenever it runs low keeps only a few pending appendix tables.
+    def __init__(self, flowables, pending):
+        super().__init__(flowables)
+        self.pending = pending
+
+    def __len__(self):
+        while self.pending is not None and list.__len__(self) < 3:
+            flowable = next(self.pending, None)
+            if flowable is None:
+                self.pending = None
+            else:
+                self.append(flowable)
+        return list.__len__(self)
+
+def generate_expense_report(df_categorized, recommendations, summary, description_col='description',
+                            full_appendix=False, output_path=None):
+    category_spending = summary['category_spending']
+    category_counts = summary['category_counts']
+    if full_appendix and output_path is None:
+        fd, output_path = tempfile.mkstemp(suffix='.pdf', prefix='transactai_report_')
+        os.close(fd)
+    pdf_buffer = output_path or io.BytesIO()
     doc = SimpleDocTemplate(pdf_buffer, pagesize=A4,
                             rightMargin=0.75 * inch, leftMargin=0.75 * inch,
                             topMargin=1 * inch, bottomMargin=0.75 * inch)
@@ -109,12 +211,12 @@ def generate_expense_report(df_categorized, recommendations, category_spending,
     elements.append(date_para)
     elements.append(Spacer(1, 20))
     elements.append(Paragraph("Executive Summary", heading_style))
-    total_expenses = df_categorized[df_categorized['category'] != 'Income']['amount'].sum()
-    total_income = df_categorized[df_categorized['category'] == 'Income']['amount'].sum()
-    net_balance = total_income - total_expenses
-    num_transactions = len(df_categorized)
-    num_categories = df_categorized['category'].nunique()
-    avg_confidence = df_categorized['confidence'].mean()
+    total_expenses = summary['total_expenses']
+    total_income = summary['total_income']
+    net_balance = summary['net_balance']
+    num_transactions = summary['num_transactions']
+    num_categories = summary['num_categories']
+    avg_confidence = summary['avg_confidence']
     summary_data = [
         ['Metric', 'Value'],
         ['Total Transactions', f"{num_transactions:,}"],
@@ -147,7 +249,7 @@ def generate_expense_report(df_categorized, recommendations, category_spending,
     category_data = [['Category', 'Amount', 'Count', '% of Total']]
     total_for_percentage = category_spending.sum()
     for category, amount in category_spending.items():
-        count = len(df_categorized[df_categorized['category'] == category])
+        count = category_counts[category]
         percentage = (amount / total_for_percentage * 100) if total_for_percentage > 0 else 0
         category_data.append([
             category,
@@ -213,21 +315,10 @@ def generate_expense_report(df_categorized, recommendations, category_spending,
     elements.append(Spacer(1, 20))
     elements.append(Paragraph("Top 10 Expenses", heading_style))
     elements.append(Spacer(1, 10))
-    top_expenses = df_categorized[df_categorized['category'] != 'Income'].nlargest(10, 'amount')
+    top_expenses = summary['top_expenses']
     if len(top_expenses) > 0:
         top_data = [['#', 'Description', 'Category', 'Amount']]
-        desc_col = description_col if description_col in top_expenses.columns else None
-        if desc_col is None:
-            for col in top_expenses.columns:
-                col_lower = str(col).lower()
-                if any(keyword in col_lower for keyword in ['description', 'narration', 'particulars', 'details']):
-                    desc_col = col
-                    break
-            if desc_col is None:
-                for col in top_expenses.columns:
-                    if top_expenses[col].dtype == 'object' and col not in ['category', 'transaction_type']:
-                        desc_col = col
-                        break
+        desc_col = find_description_column(top_expenses, description_col)
         for idx, (_, row) in enumerate(top_expenses.iterrows(), 1):
             if desc_col and desc_col in row.index:
                 desc = str(row[desc_col])[:35] + '...' if len(str(row[desc_col])) > 35 else str(row[desc_col])
@@ -263,6 +354,10 @@ def generate_expense_report(df_categorized, recommendations, category_spending,
     footer = Paragraph(footer_text, ParagraphStyle('Footer', parent=styles['Normal'],
                                                    fontSize=8, textColor=colors.grey, alignment=TA_CENTER))
     elements.append(footer)
+    if full_appendix:
+        elements = StreamingFlowables(elements, appendix_flowables(df_categorized, description_col, heading_style))
     doc.build(elements)
+    if output_path:
+        return output_path
     pdf_buffer.seek(0)
     return pdf_buffer
@@ -0,0 +1,73 @@
+import argparse
+import json
+import time
+import pandas as pd
+import torch
+from transformers import DistilBertTokenizerFast, DistilBertForSequenceClassification
+
+from file_processors import read_statement
+from model_utils import apply_category_rules, description_key, predict_probabilities_from_tokens
+from tokenization import load_pretokenized, save_pretokenized, tokenize_descriptions
+
+def statement_descriptions(path, description_col=None):
+    with open(path, 'rb') as f:
+        df, detected_col, _, _, _ = read_statement(f)
+    description_col = description_col or detected_col
+    if description_col is None:
+        raise SystemExit(f"No description column found in {path}; pass --description-col.")
+    keys = (description_key(desc) for desc in df[description_col].tolist())
+    return list(dict.fromkeys(key for key in keys if key is not None))
+
+def tokenize_command(args):
+    descriptions = []
+    for path in args.statements:
+        descriptions.extend(statement_descriptions(path, args.description_col))
+    descriptions = list(dict.fromkeys(descriptions))
+    tokenizer = DistilBertTokenizerFast.from_pretrained(args.tokenizer_dir)
+    start = time.perf_counter()
+    token_arrays = tokenize_descriptions(descriptions, tokenizer)
+    print(f"Tokenized {len(descriptions)} unique descriptions in {time.perf_counter() - start:.2f}s")
+    save_pretokenized(args.output, descriptions, token_arrays)
+    print(f"Token ids saved to: {args.output}.*.npy")
+
+def predict_command(args):
+    descriptions, token_arrays = load_pretokenized(args.tokens)
+    with open(args.config, 'r') as f:
+        id_map = json.load(f)['id_map']
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = DistilBertForSequenceClassification.from_pretrained(args.model_dir).to(device).eval()
+    start = time.perf_counter()
+    probabilities = predict_probabilities_from_tokens(token_arrays, model, device, args.batch_size)
+    print(f"Classified {len(descriptions)} descriptions in {time.perf_counter() - start:.2f}s")
+    results = [apply_category_rules(desc, probs, id_map) for desc, probs in zip(descriptions, probabilities)]
+    pd.DataFrame({
+        'description': descriptions,
+        'category': [category for category, _ in results],
+        'confidence': [confidence for _, confidence in results],
+    }).to_csv(args.output, index=False)
+    print(f"Predictions saved to: {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize statement descriptions once and replay them through a model.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tokenize_parser = subparsers.add_parser('tokenize', help="Save int32 token ids for the unique descriptions")
+    tokenize_parser.add_argument('statements', nargs='+', help="CSV or Excel bank statements")
+    tokenize_parser.add_argument('--output', required=True, help="Path prefix for the .npy files")
+    tokenize_parser.add_argument('--description-col', help="Override the detected description column")
+    tokenize_parser.add_argument('--tokenizer-dir', default='expense_model_distilbert')
+    tokenize_parser.set_defaults(run=tokenize_command)
+
+    predict_parser = subparsers.add_parser('predict', help="Classify saved token ids without loading a tokenizer")
+    predict_parser.add_argument('tokens', help="Path prefix given to 'tokenize --output'")
+    predict_parser.add_argument('--model-dir', default='expense_model_distilbert')
+    predict_parser.add_argument('--config', default='model_config.json')
+    predict_parser.add_argument('--batch-size', type=int, default=64)
+    predict_parser.add_argument('--output', default='predictions.csv')
+    predict_parser.set_defaults(run=predict_command)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
-def generate_recommendations(df_cat):
+from aggregations import period_expense_table
+
+def generate_recommendations(summary):
     recommendations = []
-    category_spending = df_cat.groupby('category')['amount'].sum().sort_values(ascending=False)
+    category_spending = summary['category_spending']
 
-    total_expenses = df_cat[df_cat['category'] != 'Income']['amount'].sum()
-    total_income = df_cat[df_cat['category'] == 'Income']['amount'].sum()
-    balance = total_income - total_expenses
+    total_expenses = summary['total_expenses']
+    total_income = summary['total_income']
+    balance = summary['net_balance']
 
     if total_expenses > 0.8 * total_income:
         recommendations.append({
@@ -47,4 +49,51 @@ def generate_recommendations(df_cat):
             'message': f'You earned Rs {category_spending["Cashback"]:,.2f} as cashback. Consider using more reward programs.'
         })
 
-    return recommendations, category_spending
+    if summary.get('period_rollups') is not None:
+        recommendations.extend(generate_period_recommendations(summary['period_rollups']))
+
+    return recommendations
+
+def generate_period_recommendations(period_rollups):
+    recommendations = []
+    monthly = period_expense_table(period_rollups, 'monthly')
+    monthly_totals = monthly.sum(axis=1)
+    if len(monthly_totals) < 2:
+        return recommendations
+
+    current_month = monthly_totals.index[-1]
+    current, previous = monthly_totals.iloc[-1], monthly_totals.iloc[-2]
+    if previous > 0:
+        change = (current - previous) / previous
+        if change > 0.2:
+            recommendations.append({
+                'type': 'warning',
+                'title': 'Spending Up Month-over-Month',
+                'message': f'Expenses in {current_month:%B %Y} rose {change:.0%} to Rs {current:,.2f} compared with the previous month.'
+            })
+        elif change < -0.1:
+            recommendations.append({
+                'type': 'success',
+                'title': 'Spending Down Month-over-Month',
+                'message': f'Expenses in {current_month:%B %Y} fell {-change:.0%} to Rs {current:,.2f} compared with the previous month.'
+            })
+
+    category_change = monthly.iloc[-1] - monthly.iloc[:-1].mean()
+    if len(category_change) > 0:
+        rising_category = category_change.idxmax()
+        if category_change[rising_category] > 0.1 * current:
+            recommendations.append({
+                'type': 'tip',
+                'title': f'Rising {rising_category} Spending',
+                'message': f'{rising_category} spending in {current_month:%B %Y} was Rs {category_change[rising_category]:,.2f} above its average for earlier months.'
+            })
+
+    if len(monthly_totals) > 2:
+        peak_month = monthly_totals.idxmax()
+        recommendations.append({
+            'type': 'info',
+            'title': 'Peak Spending Month',
+            'message': f'{peak_month:%B %Y} had the highest expenses at Rs {monthly_totals[peak_month]:,.2f}, against a monthly average of Rs {monthly_totals.mean():,.2f}.'
+        })
+
+    return recommendations
@@ -0,0 +1,47 @@
+import numpy as np
+
+MAX_LENGTH = 32
+
+def tokenize_descriptions(descriptions, tokenizer, max_length=MAX_LENGTH):
+    encoded = tokenizer(list(descriptions), truncation=True, max_length=max_length)['input_ids']
+    return [np.asarray(ids, dtype=np.int32) for ids in encoded]
+
+def get_token_ids(descriptions, tokenizer, token_cache=None, max_length=MAX_LENGTH):
+    if token_cache is None:
+        return tokenize_descriptions(descriptions, tokenizer, max_length)
+    missing = [desc for desc in dict.fromkeys(descriptions) if desc not in token_cache]
+    if missing:
+        token_cache.update(zip(missing, tokenize_descriptions(missing, tokenizer, max_length)))
+    return [token_cache[desc] for desc in descriptions]
+
+def pack_token_ids(token_arrays):
+    lengths = np.fromiter((len(ids) for ids in token_arrays), dtype=np.int32, count=len(token_arrays))
+    if not token_arrays:
+        return np.zeros(0, dtype=np.int32), lengths
+    return np.concatenate(token_arrays).astype(np.int32), lengths
+
+def unpack_token_ids(token_ids, lengths):
+    if len(lengths) == 0:
+        return []
+    return np.split(token_ids, np.cumsum(lengths)[:-1])
+
+def pad_token_ids(token_arrays, pad_id=0):
+    token_ids, lengths = pack_token_ids(token_arrays)
+    # Pad to the longest row in the batch rather than MAX_LENGTH; the attention mask
+    # hides the padding, so short narrations don't pay for 32 positions.
+    attention_mask = np.arange(lengths.max(initial=1)) < lengths[:, None]
+    input_ids = np.full(attention_mask.shape, pad_id, dtype=np.int64)
+    input_ids[attention_mask] = token_ids
+    return input_ids, attention_mask.astype(np.int64)
+
+def save_pretokenized(path_prefix, descriptions, token_arrays):
+    token_ids, lengths = pack_token_ids(token_arrays)
+    np.save(f"{path_prefix}.token_ids.npy", token_ids)
+    np.save(f"{path_prefix}.lengths.npy", lengths)
+    np.save(f"{path_prefix}.descriptions.npy", np.array(descriptions, dtype=str))
+
+def load_pretokenized(path_prefix):
+    token_ids = np.load(f"{path_prefix}.token_ids.npy")
+    lengths = np.load(f"{path_prefix}.lengths.npy")
+    descriptions = np.load(f"{path_prefix}.descriptions.npy").tolist()
+    return descriptions, unpack_token_ids(token_ids, lengths)
@@ -0,0 +1,132 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from fast_classifier import FAST_MODEL_PATH, fit_fast_classifier, save_fast_classifier, fast_probabilities
+from model_utils import load_model_components, predict_probabilities
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def load_descriptions(path, description_col, category_col, label_map):
+    df = pd.read_csv(path)
+    df = df[df[description_col].notna() & (df[description_col].astype(str).str.strip() != '')]
+    if category_col is None:
+        return df[description_col].astype(str).tolist(), None
+    df = df[df[category_col].isin(label_map)]
+    return df[description_col].astype(str).tolist(), df[category_col].map(label_map).to_numpy()
+
+def transformer_predictions(descriptions, model, tokenizer, device):
+    probs, seconds = timed(predict_probabilities, descriptions, model, tokenizer, device)
+    return np.stack(probs).argmax(axis=1), seconds
+
+def cascade_report(classifier, descriptions, labels, num_labels, transformer_preds=None, transformer_seconds=None,
+                   thresholds=THRESHOLDS, metric='accuracy'):
+    # With distilled labels the transformer is the reference, so the scores measure
+    # agreement with it and its own score would always be 1.0.
+    fast_probs, fast_seconds = timed(fast_probabilities, classifier, descriptions, num_labels)
+    fast_preds = fast_probs.argmax(axis=1)
+    fast_confidence = fast_probs.max(axis=1)
+    rows = []
+    for threshold in thresholds:
+        confident = fast_confidence >= threshold
+        coverage = confident.mean()
+        row = {
+            'threshold': threshold,
+            'fast_coverage': coverage,
+            f'fast_path_{metric}': (fast_preds[confident] == labels[confident]).mean() if confident.any() else np.nan,
+        }
+        if transformer_preds is not None:
+            row[f'cascade_{metric}'] = (np.where(confident, fast_preds, transformer_preds) == labels).mean()
+            # Transformer cost scales with the rows it still sees, so the cascade time is
+            # estimated from the two measured full-set runs.
+            row['rows_per_second'] = len(descriptions) / (fast_seconds + (1 - coverage) * transformer_seconds)
+        rows.append(row)
+    baselines = {f'fast_only_{metric}': (fast_preds == labels).mean(),
+                 'fast_rows_per_second': len(descriptions) / fast_seconds}
+    if transformer_preds is not None:
+        if metric == 'accuracy':
+            baselines['transformer_accuracy'] = (transformer_preds == labels).mean()
+        baselines['transformer_rows_per_second'] = len(descriptions) / transformer_seconds
+    return pd.DataFrame(rows), baselines
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the fast n-gram classifier used by cascade mode.")
+    parser.add_argument('data', help="CSV file with transaction descriptions")
+    parser.add_argument('--description-col', default='description')
+    parser.add_argument('--category-col', default='category',
+                        help="Column with reference categories (ignored with --distill)")
+    parser.add_argument('--distill', action='store_true',
+                        help="Label the descriptions with the DistilBERT model instead of a category column")
+    parser.add_argument('--no-transformer', action='store_true',
+                        help="Skip the DistilBERT comparison in the threshold report")
+    parser.add_argument('--test-size', type=float, default=0.15)
+    parser.add_argument('--model-dir', default='expense_model_distilbert')
+    parser.add_argument('--config', default='model_config.json')
+    parser.add_argument('--output', default=FAST_MODEL_PATH)
+    parser.add_argument('--report', help="Optional CSV path for the threshold report")
+    args = parser.parse_args()
+
+    if args.distill and args.no_transformer:
+        parser.error("--distill needs the transformer")
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    label_map = config['label_map']
+    num_labels = config['num_labels']
+
+    model = tokenizer = device = None
+    if args.distill or not args.no_transformer:
+        model, tokenizer, device, _ = load_model_components(args.model_dir, args.config)
+
+    descriptions, labels = load_descriptions(
+        args.data, args.description_col, None if args.distill else args.category_col, label_map
+    )
+    if args.distill:
+        print(f"Labelling {len(descriptions)} descriptions with DistilBERT...")
+        labels, distill_seconds = transformer_predictions(descriptions, model, tokenizer, device)
+    print(f"Loaded {len(descriptions)} samples with {len(set(labels))} categories")
+    if len(set(labels)) < 2:
+        raise SystemExit("Need at least two categories to fit the fast model.")
+
+    stratify = labels if pd.Series(labels).value_counts().min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        descriptions, labels, test_size=args.test_size, stratify=stratify, random_state=42
+    )
+    print(f"Train: {len(X_train)} samples | Test: {len(X_test)} samples")
+
+    classifier, fit_seconds = timed(fit_fast_classifier, X_train, y_train)
+    print(f"Fast model fitted in {fit_seconds:.1f}s")
+
+    transformer_preds = transformer_seconds = None
+    if args.distill:
+        # The distilled labels already are DistilBERT's predictions; reuse them and
+        # their timing instead of running the model over the test split again.
+        transformer_preds = np.asarray(y_test)
+        transformer_seconds = distill_seconds * len(X_test) / len(descriptions)
+    elif not args.no_transformer:
+        transformer_preds, transformer_seconds = transformer_predictions(X_test, model, tokenizer, device)
+
+    metric = 'agreement' if args.distill else 'accuracy'
+    report, baselines = cascade_report(classifier, X_test, np.asarray(y_test), num_labels,
+                                       transformer_preds, transformer_seconds, metric=metric)
+    print(f"\n{metric.capitalize()} / throughput trade-off on the held-out split:")
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    for name, value in baselines.items():
+        print(f"{name:30}: {value:.3f}")
+    if args.report:
+        report.to_csv(args.report, index=False)
+        print(f"Report saved to: {args.report}")
+
+    save_fast_classifier(classifier, args.output)
+    print(f"Fast model saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()